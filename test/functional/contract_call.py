@@ -14,6 +14,7 @@ Major test call smart contract
 # Imports should be in PEP8 ordering (std library first, then third party
 # libraries then local imports).
 from collections import defaultdict
+import os
 import random
 import  time
 from decimal import Decimal
@@ -25,19 +26,39 @@ from test_framework.util import (
     assert_equal,
     assert_greater_than,
     assert_contains,
+    assert_mempool_empty,
     generate_contract,
     caller_factory,
-    sync_mempools,
-    sync_blocks,
+    BulkCaller,
+    batch_rpc,
+    bulk_new_addresses,
+    in_mempool,
+    sync_mempools_zmq,
+    zmq_args,
 )
 from test_framework.contract import Contract
 
 # TODO SKIP should be set False
 SKIP = False
 PAYABLE = "payable"
+ONE = Decimal("1")
+ZERO = Decimal("0")
+DUST = Decimal("0.00000009").quantize(Decimal("0.000000"))
+ONE_MILLI = Decimal("0.001")
+MAX_I32 = 2 ** 31 - 1
+# magnachaind默认的-limitancestorcount
+ANCESTOR_LIMIT = 30
 CYCLE_CALL = "callOtherContractTest"
 
 
+def skippable(phase):
+    '''
+    标记可以被SKIP跳过的子用例
+    '''
+    phase.skippable = True
+    return phase
+
+
 class ContractCallTest(MagnaChainTestFramework):
     # Each functional test is a subclass of the MagnaChainTestFramework class.
 
@@ -50,81 +71,146 @@ class ContractCallTest(MagnaChainTestFramework):
         This method must be overridden and num_nodes must be exlicitly set."""
         self.setup_clean_chain = True
         self.num_nodes = 2
+        self._caller_cache = {}
+        self.sync_mempools = sync_mempools_zmq
+
+    def add_options(self, parser):
+        parser.add_option("--group", dest="group", type="choice", default=None,
+                          choices=["main", "dust", "fatigue"],
+                          help="Only run one group of independent phases, so that test_runner can run the groups "
+                               "in parallel (default: all phases)")
+
+    def setup_network(self, sidechain=False):
+        # zmq ports depend on the port seed, which is only known from here on
+        self.extra_args = [zmq_args(i) for i in range(self.num_nodes)]
+        super(ContractCallTest, self).setup_network(sidechain=sidechain)
+
+    def mine_if_mempool_full(self, node):
+        '''
+        内存池接近祖先交易数限制时才挖块，否则留给之后的generate一起打包
+        '''
+        if node.getmempoolinfo()['size'] > ANCESTOR_LIMIT - 5:
+            node.generate(nblocks=1)
+
+    def _caller(self, contract_id, sender):
+        '''
+        同一个(contract_id, sender)只创建一次ContractCaller
+        '''
+        key = (contract_id, sender)
+        if key not in self._caller_cache:
+            self._caller_cache[key] = caller_factory(self, contract_id, sender)
+        return self._caller_cache[key]
 
     def run_test(self):
         """Main test logic"""
+        for phase in self.group_phases(self.options.group):
+            phase(self)
+
+    @classmethod
+    def group_phases(cls, group):
+        '''
+        返回分组需要执行的子用例，每组都从_phase_prepare开始
+        '''
+        if group is None:
+            return cls.PHASES
+        grouped = set().union(*cls.GROUPS.values())
+        if group == "main":
+            return [phase for phase in cls.PHASES if phase not in grouped]
+        return [cls._phase_prepare] + [phase for phase in cls.PHASES if phase in cls.GROUPS[group]]
+
+    def _phase_prepare(self):
         # prepare
-        node = self.nodes[0]
-        node2 = self.nodes[1]
+        node = self.node = self.nodes[0]
         node.generate(nblocks=2)  # make some coins
         self.sync_all()
 
         # publish
-        contract = generate_contract(self.options.tmpdir)
-        result = node.publishcontract(contract)
-        contract_id = result['contractaddress']
-        sender = result['senderaddress']
-
-        call_contract = caller_factory(self, contract_id, sender)
+        # 各阶段用到的合约在这里通过一个batch一次性发布，之后按名字取用
+        self.contract = generate_contract(self.options.tmpdir)
+        # 疲劳测试的合约多一个fatigueComposite函数，放在单独的目录里，不覆盖contract.lua
+        fatigue_dir = os.path.join(self.options.tmpdir, "fatigue")
+        os.makedirs(fatigue_dir, exist_ok=True)
+        fatigue_contract = generate_contract(fatigue_dir, err_type="fatigue_composite")
+        names = ("main", "send_coin", "cb", "cc", "cd", "dust_change")
+        results = batch_rpc(node, [("publishcontract", (self.contract,))] * len(names) +
+                            [("publishcontract", (fatigue_contract,))])
+        names += ("last",)
+        self.contract_ids = {name: result['contractaddress'] for name, result in zip(names, results)}
+        self.contract_id = self.contract_ids["main"]
+        self.sender = results[0]['senderaddress']
+
+        self.call_contract = self._caller(self.contract_id, self.sender)
+
+    def _phase_invalid_args(self):
+        contract_id = self.contract_id
+        sender = self.sender
+        call_contract = self.call_contract
         # call
         # no coins
         assert_contains(call_contract(PAYABLE, amount=10000000), "Insufficient funds")
 
         # # 非法的入参
-        for amount in [10000000000, -1, 0, Decimal("0.00000009").quantize(Decimal("0.000000"))]:
+        for amount in [10000000000, -1, 0, DUST]:
             call_contract(PAYABLE, amount=amount)
 
         # 非法sender
         for sender_addr in [sender + "x", contract_id]:
-            assert_contains(caller_factory(self, contract_id, sender_addr)(PAYABLE), "Invalid sender address")
+            assert_contains(self._caller(contract_id, sender_addr)(PAYABLE), "Invalid sender address")
 
         # # 合约不存在
-        assert_contains(caller_factory(self, "2PPWpHssgXjA8yEgfd3Vo36Hhx1eimbGCcP", sender)(PAYABLE),
+        assert_contains(self._caller("2PPWpHssgXjA8yEgfd3Vo36Hhx1eimbGCcP", sender)(PAYABLE),
                         "GetContractInfo fail")
 
         # # 地址错误
         for addr in [contract_id + 'x', sender]:
-            caller_factory(self, addr, sender)(PAYABLE)
+            self._caller(addr, sender)(PAYABLE)
 
+    @skippable
+    def _phase_invalid_calls(self):
+        node = self.node
+        call_contract = self.call_contract
         # 函数不存在
-        if not SKIP:
-            assert_contains(call_contract("payable2"), "can not find function")
+        assert_contains(call_contract("payable2"), "can not find function")
 
         # send不能被裸调用
         # bug被修复前，暂时跳过
-        if not SKIP:
-            assert_contains(call_contract("send",sender,0),'can not call lua internal function directly')
-            assert_contains(call_contract("rpcSendTest"), 'can not call lua internal function directly')
+        assert_contains(call_contract("send",self.sender,0),'can not call lua internal function directly')
+        assert_contains(call_contract("rpcSendTest"), 'can not call lua internal function directly')
 
         # when not commit transaction, make sure contract tx is not in mempool
-        if not SKIP:
-            mempool = node.getrawmempool()
-            node.callcontract(False, 1, contract_id, sender, PAYABLE)
-            assert mempool == node.getrawmempool()
+        mempool = node.getrawmempool()
+        node.callcontract(False, 1, self.contract_id, self.sender, PAYABLE)
+        assert mempool == node.getrawmempool()
 
+    def _phase_recharge(self):
+        node = self.node
+        node2 = self.nodes[1]
         # recharge to contract
-        txid = call_contract(PAYABLE,amount = 1000)['txid']
-        sync_mempools(self.nodes)
-        assert txid in node.getrawmempool()
-        assert txid in node2.getrawmempool()
-        assert_equal(node.getbalanceof(contract_id), 0)  #合约的余额只会在一定的确认数之后才可以查看，在内存池中是不生效的
+        txid = self.call_contract(PAYABLE,amount = 1000)['txid']
+        sync_mempools_zmq(self.nodes)
+        assert in_mempool(node, txid)
+        assert in_mempool(node2, txid)
+        assert_equal(node.getbalanceof(self.contract_id), 0)  #合约的余额只会在一定的确认数之后才可以查看，在内存池中是不生效的
         node.generate(nblocks=1)
         self.sync_all()
-        assert txid not in node.getrawmempool()
-        assert txid not in node2.getrawmempool()
-        assert_equal(node.getbalanceof(contract_id), 1000)  # 确认合约余额
-
+        assert not in_mempool(node, txid)
+        assert not in_mempool(node2, txid)
+        assert_equal(node.getbalanceof(self.contract_id), 1000)  # 确认合约余额
 
+    def _phase_double_spend(self):
         # doubleSpendTest
         self.test_double_spend(mineblock=False)
         self.test_double_spend()
-        call_contract("doubleSpendTest", node.getnewaddress(),throw_exception = True)
+        self.call_contract("doubleSpendTest", self.node.getnewaddress(),throw_exception = True)
 
+    @skippable
+    def _phase_cmsgpack(self):
         # cmsgpackTest
-        if not SKIP:
-            assert_contains(call_contract("cmsgpackTest", node.getnewaddress(), 0), 'cmsgpack => sc >= LUACMSGPACK_MAX_NESTING')
-        self.sync_all()
+        assert_contains(self.call_contract("cmsgpackTest", self.node.getnewaddress(), 0), 'cmsgpack => sc >= LUACMSGPACK_MAX_NESTING')
 
+    def _phase_tail_loop(self):
+        call_contract = self.call_contract
+        self.sync_all()
 
         # # tailLoopTest
         call_contract("tailLoopTest", 896)  # v452,594 is the limit
@@ -138,46 +224,55 @@ class ContractCallTest(MagnaChainTestFramework):
         # # unpackTest
         assert_contains(call_contract("unpackTest"), "too many results to unpack")
 
+    @skippable
+    def _phase_local_func(self):
         # localFuncTest
-        if not SKIP:
-            assert_contains(call_contract("localFuncTest"), "can not find function")
+        assert_contains(self.call_contract("localFuncTest"), "can not find function")
 
+    @skippable
+    def _phase_long_return(self):
         # longReturnTest
-        if not SKIP:
-            c = generate_contract(self.options.tmpdir, err_type="long_string_return")
-            addre = node.publishcontract(c)['contractaddress']
-            node.callcontract(True,1,addre,sender,'longReturnTest')
+        c = generate_contract(self.options.tmpdir, err_type="long_string_return")
+        addre = self.node.publishcontract(c)['contractaddress']
+        self.node.callcontract(True,1,addre,self.sender,'longReturnTest')
 
+    def _phase_contract_data(self):
+        node = self.node
         # contractDataTest
-        call_contract("contractDataTest")
-        assert_equal(call_contract("get", "size")['return'][0], 127)
+        self.call_contract("contractDataTest")
+        assert_equal(self.call_contract("get", "size")['return'][0], 127)
 
         # make sure node1 mempool is empty
         node.generate(nblocks=2)
-        assert_equal([], node.getrawmempool())
+        assert_mempool_empty(node)
+
+    def _phase_send_coin(self):
+        node = self.node
+        node2 = self.nodes[1]
+        call_contract = self.call_contract
         # sendCoinTest
         # send to mgc address
         new_address = node.getnewaddress()
         txid = call_contract("sendCoinTest", new_address, 1)['txid']
-        assert txid in node.getrawmempool()
+        assert in_mempool(node, txid)
         call_contract("sendCoinTest", new_address, "1e-3")
-        assert_contains(call_contract("sendCoinTest", new_address, 2 ** 31 - 1), "not enough amount ")
+        assert_contains(call_contract("sendCoinTest", new_address, MAX_I32), "not enough amount ")
         assert_contains(call_contract("sendCoinTest", new_address, 0.1), "JSON integer out of range")
         assert_contains(call_contract("sendCoinTest", new_address, 0), "SendCoins => amount(0) out of range")
         assert_contains(call_contract("sendCoinTest", new_address, -1), "SendCoins => amount(-100000000) out of range")
         # send all balance
-        tmp_id = node.publishcontract(contract)["contractaddress"]
-        tmp_caller = caller_factory(self, tmp_id, sender)
-        tmp_caller(PAYABLE, amount=Decimal("1"))
-        tmp_txid = tmp_caller("sendCoinTest", new_address, 1, amount=Decimal("0"),throw_exception = True)['txid']
+        tmp_id = self.contract_ids["send_coin"]
+        tmp_caller = self._caller(tmp_id, self.sender)
+        tmp_caller(PAYABLE, amount=ONE)
+        tmp_txid = tmp_caller("sendCoinTest", new_address, 1, amount=ZERO,throw_exception = True)['txid']
         # 利用节点2挖矿，确保节点1的交易可以打包的块
         self.sync_all()
         node2.generate(nblocks=2)  # 这里需要挖2个，因为send的输出需要达到成熟度才可以使用
         self.sync_all()
         # make sure two transactions not in mempool
         # if assert failed it should be bug here
-        assert txid not in node.getrawmempool()
-        assert tmp_txid not in node.getrawmempool()
+        assert not in_mempool(node, txid)
+        assert not in_mempool(node, tmp_txid)
         self.sync_all()
         assert_equal(node.getbalanceof(tmp_id), 0)
         assert_equal(node.getbalanceof(new_address), 2)
@@ -186,158 +281,192 @@ class ContractCallTest(MagnaChainTestFramework):
         assert_contains(tmp_caller("sendCoinTest", new_address, 1), "not enough amount ")
 
         # send to contract
-        tmp_id = node.publishcontract(contract)["contractaddress"]
         assert_contains(call_contract("sendCoinTest", tmp_id, 100), "Invalid destination address")
         node.generate(nblocks=1)
 
+    def _phase_batch_send(self):
+        node = self.node
+        call_contract = self.call_contract
         # batchSendTest
         # 12个参数是上限，除去内部调用之后，实际能用的就只有7个参数位，并且不支持数组
-        for to in range(4):
-            to_list = [node.getnewaddress() for i in range(7)]
-            call_contract("addWithdrawList", *to_list)
+        all_addrs = bulk_new_addresses(node, 28)
+        with call_contract.batched():
+            for i in range(0, len(all_addrs), 7):
+                call_contract("addWithdrawList", *all_addrs[i:i + 7])
         call_contract("batchSendTest")
         node.generate(nblocks=2)
-        for addr in to_list:
-            assert_equal(node.getbalanceof(addr), 1)
+        for balance in batch_rpc(node, [("getbalanceof", (addr,)) for addr in all_addrs[-7:]]):
+            assert_equal(balance, 1)
 
+    def _phase_update_contract(self):
         # updateContractTest
-        call_contract("updateContract", "self", "weigun")
-        assert_equal(call_contract("get", "self")['return'][0], "weigun")
-        node.generate(1)
+        self.call_contract("updateContract", "self", "weigun")
+        assert_equal(self.call_contract("get", "self")['return'][0], "weigun")
+        self.node.generate(1)
+
+        assert_mempool_empty(self.node) # make sure mempool is empty
 
-        assert_equal([],node.getrawmempool()) # make sure mempool is empty
+    @skippable
+    def _phase_cycle_self(self):
+        node = self.node
         # cycleSelfTest
         self.log.info("begin cycleSelfTest")
-        if not SKIP:
+        # 每5轮(10个调用)一起发送，然后挖块
+        with self.call_contract.batched(flush_every=10, on_flush=lambda: node.generate(1)):
             for i in range(100):
-                call_contract("cycleSelf",throw_exception = False)
-                call_contract("updateContract", "this", "",throw_exception = False)
-                if i % 5 == 0:
-                    # print("generate block at :",i)
-                    node.generate(1)
-            node.generate(1)
-
-        # assert_equal([], node.getrawmempool())  # make sure mempool is empty
+                self.call_contract("cycleSelf",throw_exception = False)
+                self.call_contract("updateContract", "this", "",throw_exception = False)
+        node.generate(1)
+
+    def _phase_max_contract_call(self):
+        # assert_mempool_empty(node)  # make sure mempool is empty
         # maxContractCallTest
-        call_contract("maxContractCallTest", 18,throw_exception = True)  # 18 is the limit
-        assert_contains(call_contract("maxContractCallTest", 19), "run out of limit instruction")
+        self.call_contract("maxContractCallTest", 18,throw_exception = True)  # 18 is the limit
+        assert_contains(self.call_contract("maxContractCallTest", 19), "run out of limit instruction")
+
+    def _phase_cycle_call_prepare(self):
+        node = self.node
         # callOtherContractTest
         # cycle call
         # step1 create contracts
-        ca_id = contract_id
-        cb_id = node.publishcontract(contract)["contractaddress"]
-        cc_id = node.publishcontract(contract)["contractaddress"]
-        caller_b = caller_factory(self, cb_id, sender)
-        caller_c = caller_factory(self, cc_id, sender)
-        caller_b("payable",10000,amount = 10000)
+        self.cb_id = self.contract_ids["cb"]
+        self.cc_id = self.contract_ids["cc"]
+        self.caller_b = self._caller(self.cb_id, self.sender)
+        caller_c = self._caller(self.cc_id, self.sender)
+        self.caller_b("payable",10000,amount = 10000)
         caller_c("payable", 10000,amount = 10000)
         node.generate(nblocks=2)
-        print(node.getbalanceof(cb_id),node.getbalanceof(cc_id))
-        balofca = node.getbalanceof(ca_id)
-
+        cb_balance, cc_balance = batch_rpc(node, [("getbalanceof", (self.cb_id,)), ("getbalanceof", (self.cc_id,))])
+        self.log.debug("cb=%s cc=%s", cb_balance, cc_balance)
+        self.balofca = node.getbalanceof(self.contract_id)
+        self.cycle_address = node.getnewaddress()
+
+    @skippable
+    def _phase_cycle_call_step2(self):
+        node = self.node
+        ca_id, cb_id, cc_id = self.contract_id, self.cb_id, self.cc_id
+        new_address = self.cycle_address
         # step2  a->b->c->a(send will be call in last a)
-        new_address = node.getnewaddress()
-        if not SKIP:
-            call_contract(CYCLE_CALL, cb_id, CYCLE_CALL, cc_id, CYCLE_CALL, ca_id, "sendCoinTest", new_address,amount = 0,throw_exception = True)
-            node.generate(nblocks=1)
-            self.sync_all()
-            assert_equal(node.getbalanceof(new_address), 1)
-            assert_equal(node.getbalanceof(cb_id), 10000 - 10)
-            assert_equal(node.getbalanceof(cc_id), 10000 - 10)
-            assert_equal(node.getbalanceof(ca_id), balofca - 10 - 1)
-        print("step2 done")
+        self.call_contract(CYCLE_CALL, cb_id, CYCLE_CALL, cc_id, CYCLE_CALL, ca_id, "sendCoinTest", new_address,amount = 0,throw_exception = True)
+        node.generate(nblocks=1)
+        self.sync_all()
+        assert_equal(node.getbalanceof(new_address), 1)
+        assert_equal(node.getbalanceof(cb_id), 10000 - 10)
+        assert_equal(node.getbalanceof(cc_id), 10000 - 10)
+        assert_equal(node.getbalanceof(ca_id), self.balofca - 10 - 1)
+        self.log.debug("step2 done")
+
+    @skippable
+    def _phase_cycle_call_step3(self):
+        cb_id, cc_id = self.cb_id, self.cc_id
+        caller_b = self.caller_b
+        new_address = self.cycle_address
         # step3 a->b->c->b,modify PersistentData
-        if not SKIP:
+        # 同一个batch内的调用在节点上按顺序执行，所以读写顺序不变
+        with caller_b.batched() as results:
             caller_b("contractDataTest")  # after called,size should be 127
-            assert_equal(caller_b("get", "size")['return'][0], 127)
-            call_contract(CYCLE_CALL, cb_id, CYCLE_CALL, cc_id, CYCLE_CALL, cb_id, "reentrancyTest",
-                          new_address,throw_exception = True)  # after called,size should be 127,because of replace dump
-            call_contract(CYCLE_CALL, cb_id, CYCLE_CALL, cc_id, CYCLE_CALL, cb_id, "contractDataTest",
-                          new_address,throw_exception = True)  # after called,size should be 126,because of the same lua vm
-            node.generate(nblocks=1)
-            assert_equal(caller_b("get", "size")['return'][0], 126)
-        print("step done")
-
+            caller_b("get", "size")
+        assert_equal(results[1]['return'][0], 127)
+        with self.call_contract.batched():
+            self.call_contract(CYCLE_CALL, cb_id, CYCLE_CALL, cc_id, CYCLE_CALL, cb_id, "reentrancyTest",
+                               new_address,throw_exception = True)  # after called,size should be 127,because of replace dump
+            self.call_contract(CYCLE_CALL, cb_id, CYCLE_CALL, cc_id, CYCLE_CALL, cb_id, "contractDataTest",
+                               new_address,throw_exception = True)  # after called,size should be 126,because of the same lua vm
+        self.node.generate(nblocks=1)
+        assert_equal(caller_b("get", "size")['return'][0], 126)
+        self.log.debug("step3 done")
+
+    @skippable
+    def _phase_dust_vin(self):
+        node = self.node
         # lots of dust vin in contract's send transaction
         # TODO:maybe  need to set payfee param in magnachaind
-        if not SKIP:
-            cd_id = node.publishcontract(contract)["contractaddress"]
-            caller_d = caller_factory(self, cd_id, sender)
-            for i in range(2000):
-                caller_d(PAYABLE, amount=Decimal("1"),throw_exception = True)
-                if i % 30 == 0:
-                    node.generate(nblocks=1)
-            new_address = node.getnewaddress()
-            caller_d("sendCoinTest", new_address, 1900, amount=Decimal("0"))
-            node.generate(nblocks=2)
-            assert_equal(node.getbalanceof(new_address), 1900)
+        cd_id = self.contract_ids["cd"]
+        caller_d = self._caller(cd_id, self.sender)
+        node.generate(nblocks=1)
+        # 每ANCESTOR_LIMIT个调用打包发送一次，需要时挖块，避免超出内存池交易链长度限制
+        bc = BulkCaller()
+        bc.append_all(cd_id, self.sender, PAYABLE, (), ONE, throw_exception=True, n=2000)
+        bc.flush(node, batch=ANCESTOR_LIMIT, on_batch=lambda: self.mine_if_mempool_full(node))
+        new_address = node.getnewaddress()
+        caller_d("sendCoinTest", new_address, 1900, amount=ZERO)
+        node.generate(nblocks=2)
+        assert_equal(node.getbalanceof(new_address), 1900)
 
+    @skippable
+    def _phase_dust_change(self):
+        node = self.node
         # dust change vout in send
         # node.sendtoaddress(new_sender,2)
-        if not SKIP:
-            tmp_id = node.publishcontract(contract)['contractaddress']
-            caller_tmp = caller_factory(self, tmp_id, sender)
-            senders = [node.getnewaddress() for i in range(101)]
-            i = 0
+        tmp_id = self.contract_ids["dust_change"]
+        caller_tmp = self._caller(tmp_id, self.sender)
+        senders = bulk_new_addresses(node, 101)
+        node.generate(1)
+        with caller_tmp.batched(flush_every=ANCESTOR_LIMIT, on_flush=lambda: self.mine_if_mempool_full(node)):
             for _ in senders:
                 # 充值101次，每次1个MGC
                 caller_tmp(PAYABLE, amount=1,throw_exception = True)
-                if i % 30 == 0:
-                    node.generate(1)
-                i += 1
-            node.generate(2)
-            assert_equal(node.getbalanceof(tmp_id), 101)
-            i = 0
+        node.generate(2)
+        assert_equal(node.getbalanceof(tmp_id), 101)
+        with caller_tmp.batched(flush_every=ANCESTOR_LIMIT,
+                                on_flush=lambda: self.mine_if_mempool_full(node)) as results:
             for to in senders:
                 # 向每个地址发送cell - 999(最小单位)，cell = 100000000。这里应该有101个微交易的找零
-                assert_equal(isinstance(caller_tmp("dustChangeTest", to, amount=Decimal("0"),throw_exception = True), dict), True)
-                if i % 30 == 0:
-                    node.generate(1)
-                i += 1
-            node.generate(nblocks=2)
-            assert_equal(node.getbalanceof(tmp_id) * COIN, 101 * COIN - (COIN - 999 ) * 101) #因为lua没有浮点数，所以小数部分会截断掉
-            bal = node.getbalanceof(tmp_id)
-            print(bal)
-            tmp_sender = node.getnewaddress()
-            assert_equal(isinstance(caller_tmp("sendCoinTest2", tmp_sender,amount=Decimal("0"),throw_exception = True), dict),
-                         True)  # 组合所有微交易的找零，应该足够0.001个MGC的
-            node.generate(nblocks=2)
-            assert_equal(node.getbalanceof(tmp_sender), Decimal("0.001"))
-            assert_equal(node.getbalanceof(tmp_id), bal - Decimal("0.001"))
+                caller_tmp("dustChangeTest", to, amount=ZERO,throw_exception = True)
+        for result in results:
+            assert_equal(isinstance(result, dict), True)
+        node.generate(nblocks=2)
+        bal = node.getbalanceof(tmp_id)
+        assert_equal(bal * COIN, 101 * COIN - (COIN - 999 ) * 101) #因为lua没有浮点数，所以小数部分会截断掉
+        self.log.debug("dust change balance: %s", bal)
+        tmp_sender = node.getnewaddress()
+        assert_equal(isinstance(caller_tmp("sendCoinTest2", tmp_sender,amount=ZERO,throw_exception = True), dict),
+                     True)  # 组合所有微交易的找零，应该足够0.001个MGC的
+        node.generate(nblocks=2)
+        assert_equal(node.getbalanceof(tmp_sender), ONE_MILLI)
+        assert_equal(node.getbalanceof(tmp_id), bal - ONE_MILLI)
 
+    def _phase_publish_last(self):
         # reentrancyTest
-        last_id = node.publishcontract(contract)['contractaddress']
-        caller_last = caller_factory(self, last_id, sender)
-        if not SKIP:
-            caller_last("reentrancyTest")
-            node.generate(nblocks=1)
-            assert_equal(caller_last("get", "this")['return'], [None])
-
+        self.last_id = self.contract_ids["last"]
+        self.caller_last = self._caller(self.last_id, self.sender)
+
+    @skippable
+    def _phase_reentrancy(self):
+        self.caller_last("reentrancyTest")
+        self.node.generate(nblocks=1)
+        assert_equal(self.caller_last("get", "this")['return'], [None])
+
+    @skippable
+    def _phase_fatigue(self):
+        node = self.node
+        caller_last = self.caller_last
         # 疲劳测试
-        if not SKIP:
-            to_list = [node.getnewaddress() for i in range(1000)]
-            for i,to in enumerate(to_list):
-                caller_last(PAYABLE, amount=100)
-                caller_last(CYCLE_CALL, last_id, "contractDataTest",amount=0)
-                caller_last(CYCLE_CALL, last_id, "dustChangeTest",to,amount=0)
-                caller_last(CYCLE_CALL, last_id, "addWithdrawList",to,amount=0)
-                # caller_last(CYCLE_CALL, last_id, "batchSendTest",amount=0)
-                if random.randint(1,100) > 40:
-                    if node.getmempoolinfo()['size'] >20:
-                        print("mempoolsize: {}".format(node.getmempoolinfo()['size']))
-                        print(node.getrawmempool())
+        to_list = bulk_new_addresses(node, 1000)
+        # 每轮有60%的概率挖块
+        mine_flags = [random.random() > 0.4 for _ in to_list]
+        for mine, to in zip(mine_flags, to_list):
+            caller_last(PAYABLE, amount=100)
+            # 相当于依次CYCLE_CALL自身的contractDataTest、dustChangeTest、addWithdrawList
+            caller_last("fatigueComposite", to, amount=0)
+            # caller_last(CYCLE_CALL, last_id, "batchSendTest",amount=0)
+            mempool_size = node.getmempoolinfo()['size']
+            if mine:
+                if mempool_size >20:
+                    self.log.debug("mempoolsize: %s", mempool_size)
+                    self.log.debug("%s", node.getrawmempool())
+                node.generate(nblocks=1)
+            else:
+                if mempool_size >28:
+                    self.log.debug("trigger size limit mempoolsize: %s", mempool_size)
+                    self.log.debug("%s", node.getrawmempool())
                     node.generate(nblocks=1)
-                else:
-                    if node.getmempoolinfo()['size'] >28:
-                        print("trigger size limit mempoolsize: {}".format(node.getmempoolinfo()['size']))
-                        print(node.getrawmempool())
-                        node.generate(nblocks=1)
 
     def test_double_spend(self,mineblock = True):
         self.log.info("test double spend")
         node = self.nodes[0]
         ct = Contract(node)
-        [ct.call_payable(amount = 100) for i in range(10)]
+        batch_rpc(node, [("callcontract", (True, 100, ct.contract_id, ct.publisher, PAYABLE))] * 10)
         node.generate(2)
         self.sync_all()
         addr = self.nodes[1].getnewaddress()
@@ -354,9 +483,9 @@ class ContractCallTest(MagnaChainTestFramework):
         self.sync_all()
         node.generate(2)
         self.sync_all()
-        print(ct.get_balance(),node.getbalanceof(addr),node.getbalanceof(addr2))
         addr_balance = node.getbalanceof(addr)
         addr2_balance = node.getbalanceof(addr2)
+        self.log.debug("%s %s %s", ct.get_balance(), addr_balance, addr2_balance)
         if not mineblock:
             if addr_balance == 0:
                 assert_equal(addr2_balance, 10)
@@ -366,5 +495,38 @@ class ContractCallTest(MagnaChainTestFramework):
         else:
             assert_equal(ct.get_balance(), contract_balance - addr_balance - addr2_balance)
 
+    # 按顺序执行的子用例，SKIP为True时，skippable的子用例在导入时就被剔除
+    PHASES = [phase for phase in (
+        _phase_prepare,
+        _phase_invalid_args,
+        _phase_invalid_calls,
+        _phase_recharge,
+        _phase_double_spend,
+        _phase_cmsgpack,
+        _phase_tail_loop,
+        _phase_local_func,
+        _phase_long_return,
+        _phase_contract_data,
+        _phase_send_coin,
+        _phase_batch_send,
+        _phase_update_contract,
+        _phase_cycle_self,
+        _phase_max_contract_call,
+        _phase_cycle_call_prepare,
+        _phase_cycle_call_step2,
+        _phase_cycle_call_step3,
+        _phase_dust_vin,
+        _phase_dust_change,
+        _phase_publish_last,
+        _phase_reentrancy,
+        _phase_fatigue,
+    ) if not (SKIP and getattr(phase, 'skippable', False))]
+
+    # 只用到自己发布的合约，不依赖主合约状态的分组，可以在不同进程中与main组并行执行
+    GROUPS = {
+        "dust": (_phase_dust_vin, _phase_dust_change),
+        "fatigue": (_phase_publish_last, _phase_reentrancy, _phase_fatigue),
+    }
+
 if __name__ == '__main__':
     ContractCallTest().main()
@@ -23,11 +23,16 @@ Smart Contract Testing - softfork test
 """
 # Imports should be in PEP8 ordering (std library first, then third party
 # libraries then local imports).
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+import os
+from pathlib import Path
+import random
 import sys
 
 # Avoid wildcard * imports if possible
 from test_framework.test_framework import MagnaChainTestFramework
+from test_framework.authproxy import JSONRPCException
 from test_framework.mininode import COIN, MINER_REWARD
 from test_framework.script import CScript
 from test_framework.util import (
@@ -38,18 +43,17 @@ from test_framework.util import (
     generate_contract,
     sync_mempools,
     sync_blocks,
-    bytes_to_hex_str,
     hex_str_to_bytes,
     connect_nodes_bi,
     wait_until,
+    batch_rpc,
+    bulk_new_addresses,
 )
 from test_framework.contract import Contract
 
 
 def get_contract_hex(contract):
-    with open(contract) as fh:
-        content = "".join(fh.readlines())
-    return bytes_to_hex_str(bytes(content, encoding='utf-8'))
+    return Path(contract).read_bytes().hex()
 
 
 class ContractForkTest(MagnaChainTestFramework):
@@ -65,13 +69,19 @@ class ContractForkTest(MagnaChainTestFramework):
 
     def run_test(self):
         """Main test logic"""
+        # split_network之后的两组节点
+        self._groups = [self.nodes[:2], self.nodes[2:]]
+        # 每个节点一个固定的调用地址，多次调用时复用
+        self.senders = [n.getnewaddress() for n in self.nodes]
         # prepare
+        # 每个节点挖块前要先同步上一个节点的块，否则会多出分叉；内存池是空的，不需要sync_mempools
         for n in self.nodes:
             n.generate(2)  # make some coins
-            self.sync_all()
+            sync_blocks(self.nodes)
 
         # main test
         self.contract_file = generate_contract(self.options.tmpdir)
+        self.hex_content = get_contract_hex(self.contract_file)
         self.tips_num = 1
         self.log.info("start test_publish_fork_with_utxo,normal utxo")
         self.test_publish_fork_with_utxo()
@@ -108,7 +118,7 @@ class ContractForkTest(MagnaChainTestFramework):
         :param contract_output:
         :return:
         '''
-        hex_content = get_contract_hex(self.contract_file)
+        hex_content = self.hex_content
         coster = self.node0.getnewaddress()
         if is_contract_output:
             ct = Contract(self.node0,self.options.tmpdir,debug = False)
@@ -134,7 +144,7 @@ class ContractForkTest(MagnaChainTestFramework):
         contract_a1 = result['contractaddress']
         # 第一组节点同步,这是该组链高度应该为12
         block_a1, block_a2 = self.node0.generate(2)
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.sync_all(self._groups)
         assert_equal(self.node1.getblockcount(), blocks_num + 2)
         assert_equal(self.node1.getbestblockhash(), block_a2)
         last_block_hash = block_a2
@@ -148,18 +158,16 @@ class ContractForkTest(MagnaChainTestFramework):
         contract_b1 = result['contractaddress']
         # 第二组节点同步,这是该组链高度应该为22
         block_b13 = self.node2.generate(12)[11]
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.sync_all(self._groups)
         assert_equal(self.node2.getblockcount(), blocks_num + 12)
         assert_equal(self.node2.getbestblockhash(), block_b13)
 
         blocks = self.make_more_work_than(2, 0)
 
         # 合并网络
-        for i in range(4):
-            print("before join:", i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
+        self.log_chain_state("before join")
         self.join_network()
-        for i in range(4):
-            print(i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
+        self.log_chain_state("after join")
         # 确认存在分叉存在，并且主链为22个区块的
         tips = self.nodes[0].getchaintips()
         # print(tips)
@@ -209,7 +217,7 @@ class ContractForkTest(MagnaChainTestFramework):
         self.sync_all()
         assert_equal(self.node0.getrawmempool(), [])
 
-        hex_content = get_contract_hex(self.contract_file)
+        hex_content = self.hex_content
         coster = self.node0.getnewaddress()
         sendtx = self.node0.sendtoaddress(coster, 1000)
         self.node0.generate(1)
@@ -239,19 +247,17 @@ class ContractForkTest(MagnaChainTestFramework):
         gen_blocks = len(blocks)
 
         # join network
-        for i in range(4):
-            print("before join:", i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
-            print("mempool:", self.nodes[i].getrawmempool())
+        self.log_chain_state("before join", with_mempool=True)
 
-        print("join network")
+        self.log.debug("join network")
         connect_nodes_bi(self.nodes, 1, 2)
         sync_blocks(self.nodes)
 
         for i in range(4):
-            print("mempool:", self.nodes[i].getrawmempool())
+            self.log.debug("mempool: %s", self.nodes[i].getrawmempool())
         # 确认存在分叉存在
         tips = self.nodes[1].getchaintips()
-        print(tips)
+        self.log.debug("%s", tips)
         assert_equal(len(tips), self.tips_num + 1)
         self.tips_num += 1
         assert_equal(self.node1.getblockcount(), blocks_num + 4 + gen_blocks)
@@ -302,7 +308,7 @@ class ContractForkTest(MagnaChainTestFramework):
         assert_equal(self.node1.getrawmempool(), [])  # make sure mempool empty
         ct = Contract(self.node1,self.options.tmpdir,debug=False)
         ct.call_payable(amount = 100)
-        print(ct.publish_txid)
+        self.log.debug("%s", ct.publish_txid)
         self.sync_all()
         self.node0.generate(2)
         self.sync_all()
@@ -318,7 +324,7 @@ class ContractForkTest(MagnaChainTestFramework):
         addr_N1 = self.node1.getnewaddress()
         txid1 = ct.call_sendCoinTest(addr_N1,contract_balance,amount = 0).txid
         self.node1.generate(2)
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.sync_all(self._groups)
         assert_equal(self.node1.getbalanceof(addr_N1), 100)
         assert_equal(ct.get_balance(), 0)
 
@@ -326,20 +332,20 @@ class ContractForkTest(MagnaChainTestFramework):
         addr_N3 = self.node3.getnewaddress()
         txid2 = ct.call_sendCoinTest(addr_N3,contract_balance,amount = 0,exec_node = self.node3).txid
         self.node3.generate(3)
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.sync_all(self._groups)
         assert_equal(self.node3.getbalanceof(addr_N3), 100)
         assert_equal(ct.get_balance(exec_node=self.node3), 0)
 
         # join network
-        print("join network")
+        self.log.debug("join network")
         connect_nodes_bi(self.nodes, 1, 2)
         sync_blocks(self.nodes)
 
         for i in range(4):
-            print("mempool:", self.nodes[i].getrawmempool())
+            self.log.debug("mempool: %s", self.nodes[i].getrawmempool())
         # 确认存在分叉存在
         tips = self.nodes[1].getchaintips()
-        print(tips)
+        self.log.debug("%s", tips)
         assert_equal(len(tips), self.tips_num + 1)
         self.tips_num += 1
 
@@ -377,7 +383,7 @@ class ContractForkTest(MagnaChainTestFramework):
         ct = Contract(self.node1,self.options.tmpdir,debug=False)
         ct2 = Contract(self.node1, self.options.tmpdir,debug=False)
         ct2.call_payable(amount=1000)
-        print(ct.publish_txid)
+        self.log.debug("%s", ct.publish_txid)
         self.sync_all()
         self.node0.generate(2)
         self.sync_all()
@@ -402,73 +408,69 @@ class ContractForkTest(MagnaChainTestFramework):
         self.log.info('cur blockcount:{}'.format(self.node1.getblockcount()))
         if with_send:
             tmp_ct = Contract(self.node1, debug=False)
-            print(tmp_ct.publish_txid)
+            self.log.debug("%s", tmp_ct.publish_txid)
             # why after this call ,ct balance at node1 is 1980,it should 1990
             tx_a13 = ct.call_callOtherContractTest(ct2.contract_id, 'callOtherContractTest', tmp_ct.contract_id,
                                                    "contractDataTest",amount = 0)
-            print("ct balance:", ct.get_balance())
-            print(tx_a13.txid)
-        print(tx_a1, tx_a11, tx_a12)
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+            self.log.debug("ct balance: %s", ct.get_balance())
+            self.log.debug("%s", tx_a13.txid)
+        self.log.debug("%s %s %s", tx_a1, tx_a11, tx_a12)
+        self.sync_all(self._groups)
         last_block_hash = self.node1.generate(2)[-1]
         assert self.node1.getrawmempool() == []
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.sync_all(self._groups)
 
         # in group 2
         tx_b1 = ct.call_payable(amount=2000, exec_node=self.node3, sender=self.node3.getnewaddress())['txid']
-        print(tx_b1)
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.log.debug("%s", tx_b1)
+        self.sync_all(self._groups)
         self.node3.generate(2)
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.sync_all(self._groups)
         assert tx_b1 not in self.node3.getrawmempool()
         tx_b11 = ct.call_contractDataTest(amount=0, exec_node=self.node3)['txid']
-        print("ct balance:", ct.get_balance(exec_node=self.node3))
+        self.log.debug("ct balance: %s", ct.get_balance(exec_node=self.node3))
         if with_send:
             # 这里有两个crash point,下面代码分别对应不同的CP
             if crash_point == 1:
                 tx_b12 = ct.call_callOtherContractTest(ct2.contract_id, 'callOtherContractTest',
                                                        ct.contract_id, "contractDataTest", exec_node=self.node3,amount = 0)
-                print("ct balance at node3:", ct.get_balance(exec_node=self.node3))
+                self.log.debug("ct balance at node3: %s", ct.get_balance(exec_node=self.node3))
 
             else:
                 # 这里也在node1中的内存池？
                 tx_b12 = ct.call_callOtherContractTest(ct2.contract_id, 'callOtherContractTest',
                                                        ct.contract_id, "contractDataTest",amount = 0)
                 tx_b13 = ct.call_reentrancyTest(amount = 0).txid
-                print("tx_b13:", tx_b13)
-                print("ct balance:", ct.get_balance(exec_node=self.node1))
-            print("ct balance at node3:", ct.get_balance(exec_node=self.node3))
-            print("ct balance at node1:", ct.get_balance(exec_node=self.node1))
-            print("tx_b12:", tx_b12.txid)
-        print(tx_b11)
+                self.log.debug("tx_b13: %s", tx_b13)
+                self.log.debug("ct balance: %s", ct.get_balance(exec_node=self.node1))
+            self.log.debug("ct balance at node3: %s", ct.get_balance(exec_node=self.node3))
+            self.log.debug("ct balance at node1: %s", ct.get_balance(exec_node=self.node1))
+            self.log.debug("tx_b12: %s", tx_b12.txid)
+        self.log.debug("%s", tx_b11)
         block_b16 = self.node3.generate(6)[-1]
         assert_equal(self.node3.getrawmempool(), [])
         if with_send and crash_point == 1:
             assert_equal(self.node1.getrawmempool(), [])
         elif with_send and crash_point == 2:
             assert_equal(sorted(self.node1.getrawmempool()), sorted([tx_b12.txid,tx_b13]))
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        self.sync_all(self._groups)
 
         # join network
         more_work_blocks = self.make_more_work_than(3, 1)
-        for i in range(4):
-            print("before join", i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
-            print("mempool", self.nodes[i].getrawmempool())
+        self.log_chain_state("before join", with_mempool=True)
 
-        print("ct balance at node3:", ct.get_balance(exec_node=self.node3))
-        print("ct balance at node1:", ct.get_balance(exec_node=self.node1))
-        print("join network")
+        self.log.debug("ct balance at node3: %s", ct.get_balance(exec_node=self.node3))
+        self.log.debug("ct balance at node1: %s", ct.get_balance(exec_node=self.node1))
+        self.log.debug("join network")
         connect_nodes_bi(self.nodes, 1, 2)
         sync_blocks(self.nodes)
 
-        print("ct balance at node1:", ct.get_balance(exec_node=self.node1))
-        print("ct balance at node3:", ct.get_balance(exec_node=self.node3))
+        self.log.debug("ct balance at node1: %s", ct.get_balance(exec_node=self.node1))
+        self.log.debug("ct balance at node3: %s", ct.get_balance(exec_node=self.node3))
 
-        for i in range(4):
-            print("after join", i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
-            print("mempool", self.nodes[i].getrawmempool())
+        self.log_chain_state("after join", with_mempool=True)
         if with_send:
-            print("assert_equal(len(self.node1.getrawmempool()), 5),should {} == 5".format(len(self.node1.getrawmempool())))
+            self.log.debug("assert_equal(len(self.node1.getrawmempool()), 5),should %s == 5", len(self.node1.getrawmempool()))
             with_send_crash_point2 = len(self.node1.getrawmempool())
             for tx in self.node1.getrawmempool():
                 # tx_ai,tx_a11,tx_a12
@@ -494,16 +496,16 @@ class ContractForkTest(MagnaChainTestFramework):
                 如果不在这个范围，证明tx_a1,tx_a11,tx_a12这3个交易不在内存池中
                 这里打印看一下locktime和当前区块数量
                 """
-                print("=============trace=================")
+                self.log.debug("=============trace=================")
                 for tmp_tx in [tx_a1, tx_a11, tx_a12]:
-                    print(self.node1.getrawtransaction(tmp_tx, True))
+                    self.log.debug("%s", self.node1.getrawtransaction(tmp_tx, True))
                     locktime = self.node1.getrawtransaction(tmp_tx, True)['locktime']
                     self.log.info("locktime {}".format(locktime))
                 self.log.info('cur blockcount:{}'.format(self.node1.getblockcount()))
-                print("=============trace=================")
+                self.log.debug("=============trace=================")
             assert len(self.node1.getrawmempool()) >=5 and len(self.node1.getrawmempool()) < 8
         else:
-            print(" assert_equal(len(self.node1.getrawmempool()), 3),should {} == 3".format(len(self.node1.getrawmempool())))
+            self.log.debug(" assert_equal(len(self.node1.getrawmempool()), 3),should %s == 3", len(self.node1.getrawmempool()))
             for tx in self.node1.getrawmempool():
                 # tx_ai,tx_a11,tx_a12
                 if tx == tx_a1:
@@ -517,16 +519,16 @@ class ContractForkTest(MagnaChainTestFramework):
                 如果不在这个范围，证明tx_a1,tx_a11,tx_a12这3个交易不在内存池中
                 这里打印看一下locktime和当前区块数量
                 """
-                print("=============trace=================")
+                self.log.debug("=============trace=================")
                 for tmp_tx in [tx_a1, tx_a11, tx_a12]:
-                    print(self.node1.getrawtransaction(tmp_tx, True))
+                    self.log.debug("%s", self.node1.getrawtransaction(tmp_tx, True))
                     locktime = self.node1.getrawtransaction(tmp_tx, True)['locktime']
                     self.log.info("locktime {}".format(locktime))
                 self.log.info('cur blockcount:{}'.format(self.node1.getblockcount()))
-                print("=============trace=================")
+                self.log.debug("=============trace=================")
             assert_equal(len(self.node1.getrawmempool()), 3)  # 短链的块内交易必须是打回内存池的，否则可能有bug了
         assert (balance - MINER_REWARD * 2 - 2000) - self.node1.getbalance() < 100
-        print("node2 ct get_balance:", ct.get_balance(exec_node=self.node2))
+        self.log.debug("node2 ct get_balance: %s", ct.get_balance(exec_node=self.node2))
         bal = 2000
         if with_send and crash_point == 1:
             bal = 2000- 10  #这里20是因为send都从第一个合约里边去扣了
@@ -547,23 +549,18 @@ class ContractForkTest(MagnaChainTestFramework):
                          4)  # 因为本节点mempool有合约交易，所以应该为4
             assert_equal(ct.call_get('counter', broadcasting=False, exec_node=self.node2,amount = 0)['return'][0],
                      2)  # 该节点内存池中没有交易哦，所以应该为2
-        for i in range(4):
-            print("node{} ct2 get_balance:{}".format(i, ct2.get_balance(exec_node=self.nodes[i])))
-        if with_send:
-            assert_equal(self.node0.getbalanceof(ct2.contract_id), 1000 - 10 if crash_point == 1 else 1000)  # 减去合约的send调用
-            assert_equal(self.node1.getbalanceof(ct2.contract_id), 1000 - 10 if crash_point == 1 else 1000)  # 减去合约的send调用
-            assert_equal(self.node2.getbalanceof(ct2.contract_id), 1000 - 10 if crash_point == 1 else 1000)  # 减去合约的send调用
-            assert_equal(self.node3.getbalanceof(ct2.contract_id), 1000 - 10 if crash_point == 1 else 1000)  # 减去合约的send调用
-        else:
-            assert_equal(self.node0.getbalanceof(ct2.contract_id),1000)  # 减去合约的send调用
-            assert_equal(self.node1.getbalanceof(ct2.contract_id), 1000)  # 减去合约的send调用
-            assert_equal(self.node2.getbalanceof(ct2.contract_id), 1000)  # 减去合约的send调用
-            assert_equal(self.node3.getbalanceof(ct2.contract_id), 1000)  # 减去合约的send调用
-
-        for i in range(4):
-            print(i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
+        # 每个节点只查询一次ct2的余额，日志与断言共用；不同节点的查询互不依赖，并发执行
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            ct2_balances = list(executor.map(lambda n: ct2.get_balance(exec_node=n), self.nodes))
+        for i, ct2_balance in enumerate(ct2_balances):
+            self.log.debug("node%s ct2 get_balance:%s", i, ct2_balance)
+        ct2_bal = 1000 - 10 if with_send and crash_point == 1 else 1000  # 减去合约的send调用
+        for ct2_balance in ct2_balances:
+            assert_equal(ct2_balance, ct2_bal)
+
+        self.log_chain_state("chain state")
         tips = self.nodes[0].getchaintips()
-        print(tips)
+        self.log.debug("%s", tips)
         assert_equal(len(tips), self.tips_num + 1)
         self.tips_num += 1
         assert_equal(self.node2.getblockcount(), blocks_num + 16 + len(more_work_blocks))
@@ -576,30 +573,27 @@ class ContractForkTest(MagnaChainTestFramework):
         sync_blocks(self.nodes)
         assert_equal(self.node0.getrawmempool(), [])
         assert_equal(self.node1.getrawmempool(), [])
+        ct_balance = self.node1.getbalanceof(ct.contract_id)
         if with_send and crash_point == 1:
-            assert_equal(self.node1.getbalanceof(ct.contract_id), 4000 - 20)
+            assert_equal(ct_balance, 4000 - 20)
         elif with_send and crash_point == 2:
             # what the he?
-            assert_equal(self.node1.getbalanceof(ct.contract_id), 4000 - 20 if with_send_crash_point2 == 7 else 4000 - 10)
+            assert_equal(ct_balance, 4000 - 20 if with_send_crash_point2 == 7 else 4000 - 10)
         else:
-            assert_equal(self.node1.getbalanceof(ct.contract_id), 4000)
+            assert_equal(ct_balance, 4000)
         bal = 4000
         if with_send and crash_point == 1:
             bal = 4000- 20  #应该是4000- 20 的，但是现在的send都是从第一个合约里扣
         elif with_send and crash_point == 2:
             bal = 4000 - 10
-        assert_equal(self.node1.getbalanceof(ct.contract_id), bal)
+        assert_equal(ct_balance, bal)
         assert (balance - MINER_REWARD * 2 - 2000) - self.node1.getbalance() < 100
 
         # In bestchain,ensure contract data is correct
+        counter = 5 if with_send and crash_point == 1 else 4
         for i in range(4):
-            if with_send and crash_point == 1:
-                assert_equal(
-                    ct.call_get('counter', exec_node=self.nodes[i], sender=self.nodes[i].getnewaddress(),amount = 0)['return'][0], 5)
-            else:
-                assert_equal(
-                    ct.call_get('counter', exec_node=self.nodes[i], sender=self.nodes[i].getnewaddress(), amount=0)[
-                        'return'][0], 4)
+            assert_equal(
+                ct.call_get('counter', exec_node=self.nodes[i], sender=self.senders[i], amount=0)['return'][0], counter)
 
         # 未完成的用例，下面的有问题，先屏蔽
         # '''
@@ -628,7 +622,7 @@ class ContractForkTest(MagnaChainTestFramework):
         ct = Contract(self.node0,self.options.tmpdir,debug = False)
         ct2 = Contract(self.node0,self.options.tmpdir,debug = False)
         ct2.call_payable(amount=1000)
-        print(ct.publish_txid)
+        self.log.debug("%s", ct.publish_txid)
         self.sync_all()
         self.node0.generate(2)
         self.sync_all()
@@ -641,83 +635,42 @@ class ContractForkTest(MagnaChainTestFramework):
         self.make_more_work_than(2, 0)  #make sure nod2 more than node0
         balances = [n.getbalance() for n in self.nodes]
 
-        # in group 1
-        # normal transaction
-        sendtxs_a = [self.node0.sendtoaddress(self.node3.getnewaddress(), 1000) for i in range(5)]
-
-        # publish contract transaction
-        ccontracts_a = [Contract(self.node0,self.options.tmpdir,debug = False) for i in range(5)]
-
-        # call contract transaction
-        call_contract_txs_a = [ct.call_payable(amount=1000).txid for ct in ccontracts_a]
-        call_contract_txs_a1 = [ct.call_callOtherContractTest(ccontracts_a[0].contract_id, 'callOtherContractTest',
-                                                              ccontracts_a[-1].contract_id, "contractDataTest").txid for
-                                ct in ccontracts_a]
-
-        # long mempool chain transaction
-        for i in range(8):
-            result = ccontracts_a[1].call_reentrancyTest(throw_exception=False)
-
-        ccontracts_a[2].call_maxContractCallTest(2).txid
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
-
-        # in group 2
-        sendtxs_b = [self.node2.sendtoaddress(self.node1.getnewaddress(), 1000) for i in range(5)]
-
-        # publish contract transaction
-        ccontracts_b = [Contract(self.node2,self.options.tmpdir,debug = False) for i in range(5)]
-
-        # call contract transaction
-        call_contract_txs_b = [ct.call_payable(amount=1000).txid for ct in ccontracts_b]
-        call_contract_txs_b1 = [ct.call_callOtherContractTest(ccontracts_b[0].contract_id, 'callOtherContractTest',
-                                                              ccontracts_b[-1].contract_id, "contractDataTest").txid for
-                                ct in ccontracts_b]
-
-        # long mempool chain transaction
-
-        for i in range(8):
-            result = ccontracts_b[1].call_reentrancyTest(throw_exception=False)
-
-        ccontracts_b[2].call_maxContractCallTest(2).txid
-        self.sync_all([self.nodes[:2], self.nodes[2:]])
+        # 两组节点已经分割，各自的交易互不影响，用两个线程同时构造
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            group_a = executor.submit(self.mix_transactions, self.node0, self.node3, "group_a")
+            group_b = executor.submit(self.mix_transactions, self.node2, self.node1, "group_b")
+            sendtxs_a, ccontracts_a, call_contract_txs_a, call_contract_txs_a1 = group_a.result()
+            sendtxs_b, ccontracts_b, call_contract_txs_b, call_contract_txs_b1 = group_b.result()
+        self.sync_all(self._groups)
 
         # join network
         if gen_blocks:
-            for i in range(4):
-                print("before make_more_work_than:", i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
-                print("mempool:", self.nodes[i].getrawmempool())
+            self.log_chain_state("before make_more_work_than", with_mempool=True)
             blocks_a = self.node0.generate(2)
             blocks_b = self.node2.generate(8)
             more_work_blocks = self.make_more_work_than(2, 0)
 
-            for i in range(4):
-                print("before join:", i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
-                print("mempool:", self.nodes[i].getrawmempool())
+            self.log_chain_state("before join", with_mempool=True)
 
-        print("join network")
-        print("before join tips")
-        for i in range(4):
-            print(i,self.nodes[i].getchaintips(),int(self.nodes[i].getchaintipwork(), 16))
+        self.log.debug("join network")
+        self.log_chain_state("before join tips", with_tips=True)
         connect_nodes_bi(self.nodes, 1, 2)
         try:
-            print("sync_mempools.......")
+            self.log.debug("sync_mempools.......")
             sync_mempools(self.nodes, timeout=30)
-            print("sync_mempools done")
+            self.log.debug("sync_mempools done")
         except Exception as e:
-            print("sync mempool failed,ignore!")
+            self.log.debug("sync mempool failed,ignore!")
 
-        print("after join tips")
-        for i in range(4):
-            print(i,self.nodes[i].getchaintips(),int(self.nodes[i].getchaintipwork(), 16))
+        self.log_chain_state("after join tips", with_tips=True)
         sync_blocks(self.nodes)
 
         if gen_blocks:
             for i in range(4):
-                print("mempool:", self.nodes[i].getrawmempool())
-        for i in range(4):
-            print(i, self.nodes[i].getblockcount(), int(self.nodes[i].getchaintipwork(), 16))
+                self.log.debug("mempool: %s", self.nodes[i].getrawmempool())
+        self.log_chain_state("chain state")
         tips = self.nodes[0].getchaintips()
-        print("tips:", tips)
+        self.log.debug("tips: %s", tips)
         assert_equal(len(tips), self.tips_num + 1)
         self.tips_num += 1
 
@@ -725,11 +678,12 @@ class ContractForkTest(MagnaChainTestFramework):
         self.log.info("when joined,contractCall will throw EXCEPTION because of the contractPublish transaction be droped by different group")
         tx1,tx2 = None,None
         # make sure contract publish transaction in mempool
+        mempool0 = set(self.node0.getrawmempool())
         for i,c in enumerate(ccontracts_a):
             # sometimes assert failed here
-            if c.publish_txid not in self.node0.getrawmempool():
-                print("OOPS!!!!!!!OMG!!!!That's IMPOSSABLE")
-                print("contractPublish transaction {} not in mempool,index is {}.When call will throw exception".format(c.publish_txid,i))
+            if c.publish_txid not in mempool0:
+                self.log.debug("OOPS!!!!!!!OMG!!!!That's IMPOSSABLE")
+                self.log.debug("contractPublish transaction %s not in mempool,index is %s.When call will throw exception", c.publish_txid, i)
         result = ccontracts_a[2].call_reentrancyTest()
         if not result.reason():
             tx1 = result.txid
@@ -739,18 +693,17 @@ class ContractForkTest(MagnaChainTestFramework):
         try:
             sync_mempools(self.nodes, timeout=30)
         except Exception as e:
-            print("sync_mempools(self.nodes,timeout = 30) not done")
+            self.log.debug("sync_mempools(self.nodes,timeout = 30) not done")
         if tx1 and tx2:
-            wait_until(lambda: tx1 not in self.node2.getrawmempool(), timeout=10)
-            wait_until(lambda: tx1 in self.node1.getrawmempool(), timeout=10)
-            if gen_blocks:
+            def _check():
+                # 每次轮询每个节点的内存池只取一次，所有条件一起判断
+                pool1, pool2, pool3 = [set(n.getrawmempool()) for n in self.nodes[1:]]
                 # 因为tx2是主链交易，块同步后，可以找到合约的
-                wait_until(lambda: tx2 in self.node1.getrawmempool(), timeout=10)
-            else:
-                wait_until(lambda: tx2 not in self.node1.getrawmempool(), timeout=10)
-            wait_until(lambda: tx2 in self.node3.getrawmempool(), timeout=10)
+                tx2_on_node1 = tx2 in pool1 if gen_blocks else tx2 not in pool1
+                return tx1 not in pool2 and tx1 in pool1 and tx2_on_node1 and tx2 in pool3
+            wait_until(_check, timeout=10)
         else:
-            print('tx1 and tx2 is None')
+            self.log.debug("tx1 and tx2 is None")
 
         for i, n in enumerate(self.nodes):
             try:
@@ -759,10 +712,66 @@ class ContractForkTest(MagnaChainTestFramework):
                 self.log.info("Don't know why!!node{} generate failed,reason:{}".format(i,repr(e)))
                 raise
 
-            print("node{} generate done".format(i))
+            self.log.debug("node%s generate done", i)
             sync_blocks(self.nodes)
         # todo more assert
 
+    def mix_transactions(self, node, peer, folder):
+        '''
+        在node所在的分组中，混合执行各种交易
+        每个分组使用各自的合约目录，避免两个线程同时写同一个合约文件
+        :param node: 执行交易的节点
+        :param peer: 另一组的节点，提供普通交易的收款地址
+        :param folder: tmpdir下的合约目录名
+        :return: 普通交易，发布的合约，payable调用交易，callOtherContractTest调用交易
+        '''
+        contract_dir = os.path.join(self.options.tmpdir, folder)
+        os.makedirs(contract_dir, exist_ok=True)
+
+        # normal transaction
+        sendtxs = batch_rpc(node, [("sendtoaddress", (addr, 1000)) for addr in bulk_new_addresses(peer, 5)])
+
+        # publish contract transaction
+        ccontracts = Contract.publish_many(node, 5, contract_dir, debug=False)
+
+        # call contract transaction
+        call_contract_txs = [r['txid'] for r in batch_rpc(node, [
+            ("callcontract", (True, 1000, c.contract_id, c.publisher, "payable")) for c in ccontracts])]
+        call_contract_txs1 = [ct.call_callOtherContractTest(ccontracts[0].contract_id, 'callOtherContractTest',
+                                                            ccontracts[-1].contract_id, "contractDataTest").txid for
+                              ct in ccontracts]
+
+        # long mempool chain transaction
+        # 节点按顺序执行batch中的调用，交易链与逐个调用时一致；失败的调用只记录，不中断
+        reentrancy_ct = ccontracts[1]
+        results = batch_rpc(node, [("callcontract", (True, random.randint(1, 10000), reentrancy_ct.contract_id,
+                                                     reentrancy_ct.publisher, "reentrancyTest"))] * 8,
+                            return_exceptions=True)
+        for result in results:
+            if isinstance(result, JSONRPCException):
+                self.log.debug("%r", result)
+
+        ccontracts[2].call_maxContractCallTest(2).txid
+        return sendtxs, ccontracts, call_contract_txs, call_contract_txs1
+
+    def log_chain_state(self, tag, with_mempool=False, with_tips=False):
+        '''
+        记录每个节点的链状态，用于调试分叉；每个节点的查询合并成一个batch，各节点并发查询
+        :param tag: 日志前缀
+        :param with_mempool: 同时记录内存池
+        :param with_tips: 记录getchaintips，而不是块高度
+        :return:
+        '''
+        calls = [("getchaintips" if with_tips else "getblockcount", ()), ("getchaintipwork", ())]
+        if with_mempool:
+            calls.append(("getrawmempool", ()))
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            all_results = list(executor.map(lambda n: batch_rpc(n, calls), self.nodes))
+        for i, results in enumerate(all_results):
+            self.log.debug("%s %s %s %s", tag, i, results[0], int(results[1], 16))
+            if with_mempool:
+                self.log.debug("mempool: %s", results[2])
+
     def publish_contract(self, node, hex_content, coster, sender_pub, sender_pri, amount, changeaddress,
                          send_flag=True):
         pre_transaction = node.prepublishcode(hex_content, coster, sender_pub, amount, changeaddress)
@@ -770,14 +779,8 @@ class ContractForkTest(MagnaChainTestFramework):
         txhex = pre_transaction['txhex']
         spent_utxo = pre_transaction['coins']
         # print(spent_utxo)
-        prevtxs = []
-        for ele in spent_utxo:
-            info = {}
-            info['txid'] = ele['txhash']
-            info['vout'] = ele['outn']
-            info['amount'] = ele['value']
-            info['scriptPubKey'] = ele['script']
-            prevtxs.append(info)
+        prevtxs = [{'txid': ele['txhash'], 'vout': ele['outn'], 'amount': ele['value'], 'scriptPubKey': ele['script']}
+                   for ele in spent_utxo]
         signed_tx = node.signrawtransaction(txhex, prevtxs, [sender_pri, sender_pri])
         # print(signed_tx)
         if send_flag:
@@ -8,7 +8,7 @@ import tempfile
 import random
 
 
-from test_framework.util import generate_contract
+from test_framework.util import generate_contract, batch_rpc
 
 class Caller(object):
     """
@@ -97,11 +97,28 @@ class Contract(object):
         :return:
         '''
         if not self.has_publish:
-            result = self.bind_node.publishcontract(self.contract_path)
-            self.contract_id = result['contractaddress']
-            self.publisher = result['senderaddress']
-            self.publish_txid = result['txid']
-            self.has_publish = True
+            self._on_publish(self.bind_node.publishcontract(self.contract_path))
+
+    def _on_publish(self, result):
+        self.contract_id = result['contractaddress']
+        self.publisher = result['senderaddress']
+        self.publish_txid = result['txid']
+        self.has_publish = True
+
+    @classmethod
+    def publish_many(cls, node, num, contract_path=None, debug=True):
+        '''
+        发布num份相同的合约，所有publishcontract请求通过一个JSON-RPC batch发送
+        :param node:
+        :param num:
+        :param contract_path:
+        :return: 已发布的合约对象列表，顺序与发布顺序一致
+        '''
+        contracts = [cls(node, contract_path, immediate=False, debug=debug) for i in range(num)]
+        results = batch_rpc(node, [("publishcontract", (ct.contract_path,)) for ct in contracts])
+        for ct, result in zip(contracts, results):
+            ct._on_publish(result)
+        return contracts
 
     def __getattr__(self, item):
         '''
@@ -54,13 +54,27 @@ class AuthServiceProxyWrapper(object):
         else:
             return_val = self.auth_service_proxy_instance.__call__(*args, **kwargs)
 
+        self._log_call()
+
+        return return_val
+
+    def _log_call(self):
         rpc_method = self.auth_service_proxy_instance._service_name
 
         if self.coverage_logfile:
             with open(self.coverage_logfile, 'a+', encoding='utf8') as f:
                 f.write("%s\n" % rpc_method)
 
-        return return_val
+    def get_request(self, *args, **kwargs):
+        """
+        Build the request dict for a JSON-RPC batch, see batch().
+
+        """
+        self._log_call()
+        return self.auth_service_proxy_instance.get_request(*args, **kwargs)
+
+    def batch(self, rpc_call_list):
+        return self.auth_service_proxy_instance.batch(rpc_call_list)
 
     @property
     def url(self):
@@ -74,6 +74,8 @@ class MagnaChainTestFramework(object):
         self.mapped = []
         # self.mortgage_coins = [] #抵押币的txid，赎回抵押币时会用到
         self.with_gdb = False
+        # sync_all用来同步内存池的函数，子类可以在set_test_params()中替换，例如util.sync_mempools_zmq
+        self.sync_mempools = sync_mempools
         self.set_test_params()
 
         assert hasattr(self, "num_nodes"), "Test must set self.num_nodes in set_test_params()"
@@ -488,7 +490,7 @@ class MagnaChainTestFramework(object):
         for group in node_groups:
             logger = self.log if show_max_height else None
             sync_blocks(group, logger=logger, timeout=timeout)
-            sync_mempools(group, timeout=timeout)
+            self.sync_mempools(group, timeout=timeout)
 
     def enable_mocktime(self):
         """Enable mocktime for the script.
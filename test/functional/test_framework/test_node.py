@@ -102,6 +102,11 @@ class TestNode():
         assert self.rpc_connected and self.rpc is not None, "Error: no RPC connection"
         return self.rpc.__getattr__(*args, **kwargs)
 
+    def batch(self, requests):
+        """Send a list of requests (see AuthServiceProxy.get_request) in one JSON-RPC batch."""
+        assert self.rpc_connected and self.rpc is not None, "Error: no RPC connection"
+        return self.rpc.batch(requests)
+
     def start(self, extra_args=None, stderr=None):
         """Start the node."""
         if extra_args is None:
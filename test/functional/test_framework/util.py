@@ -6,6 +6,7 @@
 
 from base64 import b64encode
 from binascii import hexlify, unhexlify
+from contextlib import contextmanager
 from decimal import Decimal, ROUND_DOWN
 import hashlib
 import json
@@ -19,6 +20,11 @@ import time
 from . import coverage
 from .authproxy import AuthServiceProxy, JSONRPCException
 
+try:
+    import zmq
+except ImportError:
+    zmq = None
+
 logger = logging.getLogger("TestFramework.utils")
 
 
@@ -30,6 +36,13 @@ def assert_contains(string, sub_string):
         raise AssertionError("(%s) not in (%s)" % (sub_string, string))
 
 
+def assert_mempool_empty(node):
+    """Assert the node's mempool is empty, without fetching the txid list"""
+    size = node.getmempoolinfo()['size']
+    if size != 0:
+        raise AssertionError("mempool not empty: %d transactions" % size)
+
+
 def assert_fee_amount(fee, tx_size, fee_per_kB):
     """Assert the fee was in range"""
     target_fee = tx_size * fee_per_kB / 1000
@@ -299,6 +312,17 @@ def rpc_port(n):
         return PORT_MIN + PORT_RANGE + n + (MAX_NODES * PortSeed.n) % (PORT_RANGE - 1 - MAX_NODES)
 
 
+def zmq_port(n):
+    # p2p and rpc take the first two ranges, proxy_test.py uses the third
+    assert (n <= MAX_NODES)
+    return PORT_MIN + 3 * PORT_RANGE + n + (MAX_NODES * PortSeed.n) % (PORT_RANGE - 1 - MAX_NODES)
+
+
+def zmq_args(n):
+    """Extra args for node n to publish the notifications sync_mempools_zmq waits on."""
+    return ["-zmqpubhashtx=tcp://127.0.0.1:%d" % zmq_port(n)]
+
+
 def rpc_url(datadir, i, rpchost=None):
     rpc_u, rpc_p = get_auth_cookie(datadir)
     host = '127.0.0.1'
@@ -312,6 +336,41 @@ def rpc_url(datadir, i, rpchost=None):
     return "http://%s:%s@%s:%d" % (rpc_u, rpc_p, host, int(port))
 
 
+def batch_rpc(node, calls, return_exceptions=False):
+    """
+    Send a list of (method, params) pairs to node as one JSON-RPC batch.
+
+    The node executes the calls in order, so this is a drop-in replacement
+    for a loop of dependent calls that only saves the round-trips.
+    Returns the results in call order. A failed call raises its
+    JSONRPCException, or with return_exceptions=True is returned in its
+    slot instead.
+    """
+    requests = [getattr(node, method).get_request(*params) for method, params in calls]
+    # AuthServiceProxy's id counter is shared and not thread safe, so number
+    # the requests of this batch by their index instead
+    for i, request in enumerate(requests):
+        request['id'] = i
+    responses = {r['id']: r for r in node.batch(requests)}
+    results = []
+    for i in range(len(requests)):
+        response = responses[i]
+        if response['error'] is not None:
+            if not return_exceptions:
+                raise JSONRPCException(response['error'])
+            results.append(JSONRPCException(response['error']))
+        else:
+            results.append(response['result'])
+    return results
+
+
+def bulk_new_addresses(node, n):
+    """
+    Get n new wallet addresses from node in a single round-trip.
+    """
+    return batch_rpc(node, [("getnewaddress", ())] * n)
+
+
 # Node functions
 ################
 
@@ -469,9 +528,59 @@ def sync_mempools(rpc_connections, *, wait=1, timeout=60):
     raise AssertionError("Mempool sync failed")
 
 
+def sync_mempools_zmq(rpc_connections, *, wait=1, timeout=60):
+    """
+    Wait until everybody has the same transactions in their memory
+    pools, re-checking as soon as a node publishes a hashtx notification
+
+    The nodes must be started with zmq_args(). Without a notification the
+    mempools are still re-checked every `wait` seconds, and without python
+    zmq this is plain sync_mempools.
+    """
+    if zmq is None:
+        return sync_mempools(rpc_connections, wait=wait, timeout=timeout)
+    context = zmq.Context()
+    poller = zmq.Poller()
+    sockets = []
+    try:
+        for r in rpc_connections:
+            socket = context.socket(zmq.SUB)
+            socket.setsockopt(zmq.SUBSCRIBE, b"hashtx")
+            socket.connect("tcp://127.0.0.1:%d" % zmq_port(r.index))
+            poller.register(socket, zmq.POLLIN)
+            sockets.append(socket)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            pool = set(rpc_connections[0].getrawmempool())
+            if all(set(r.getrawmempool()) == pool for r in rpc_connections[1:]):
+                return
+            for socket, _ in poller.poll(wait * 1000):
+                # drain, one check covers every queued notification
+                while socket.poll(0):
+                    socket.recv_multipart()
+    finally:
+        for socket in sockets:
+            socket.close(linger=0)
+        context.term()
+    raise AssertionError("Mempool sync failed")
+
+
 # Transaction/Block functions
 #############################
 
+def in_mempool(node, txid):
+    """
+    Whether txid is in node's mempool, without fetching the whole mempool
+    """
+    try:
+        node.getmempoolentry(txid)
+        return True
+    except JSONRPCException as e:
+        if e.error['code'] == -5:  # RPC_INVALID_ADDRESS_OR_KEY, not in mempool
+            return False
+        raise
+
+
 def find_output(node, txid, amount):
     """
     Return index to output of txid with value amount
@@ -963,42 +1072,196 @@ def generate_contract(folder, err_type=None):
         # add_code = add_code.format(*vals)
         # add_code = "function longReturnTest() return {} '1' end\n".format("'string'," * 248)
         code += add_code
+    elif err_type == "fatigue_composite":
+        # 疲劳测试每轮的三个自调用合并到一个合约函数中，一次callcontract完成
+        code += '''
+        function fatigueComposite(to)
+            callOtherContractTest(msg.thisaddress, "contractDataTest")
+            callOtherContractTest(msg.thisaddress, "dustChangeTest", to)
+            callOtherContractTest(msg.thisaddress, "addWithdrawList", to)
+        end
+    '''
     file_path = os.path.join(folder, "contract.lua")
     with open(file_path, "w") as fh:
         fh.write(code)
     return file_path
 
 
-def caller_factory(mgr, contract_id, sender,debug = False):
+# ContractCaller出错时返回的repr(JSONRPCException)以"(错误码)"结尾
+_RPC_ERROR_CODE_RE = re.compile(r'-\d\)$')
+
+
+class BulkCaller(object):
+    '''
+    批量的callcontract调用，按字段分列保存(ids/senders/methods/args...)，
+    flush时一次性组装成JSON-RPC batch发送
     '''
 
-    :param mgr: the test_framework obj
-    :param contract_id:
-    :param sender:
-    :return: a function
+    def __init__(self):
+        self.ids = []
+        self.senders = []
+        self.methods = []
+        self.args = []
+        self.amounts = []
+        self.throws = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, contract_id, sender, method, args=(), amount=0, throw_exception=False):
+        self.append_all(contract_id, sender, method, args, amount, throw_exception, n=1)
+
+    def append_all(self, contract_id, sender, method, args=(), amount=0, throw_exception=False, n=1):
+        '''
+        添加n个相同的调用
+        '''
+        self.ids.extend([contract_id] * n)
+        self.senders.extend([sender] * n)
+        self.methods.extend([method] * n)
+        self.args.extend([tuple(args)] * n)
+        self.amounts.extend([amount] * n)
+        self.throws.extend([throw_exception] * n)
+
+    def clear(self):
+        for column in (self.ids, self.senders, self.methods, self.args, self.amounts, self.throws):
+            del column[:]
+
+    def flush(self, node, batch=None, on_batch=None):
+        '''
+        发送所有缓存的调用并清空
+        :param node:
+        :param batch: 每个JSON-RPC batch最多包含的调用数，None表示一次全部发送
+        :param on_batch: 每个batch发送之后执行，例如挖块，避免超出内存池的交易链长度限制
+        :return: 调用结果，顺序与添加顺序一致。throw_exception为False的调用出错时，对应位置为JSONRPCException
+        '''
+        total = len(self)
+        if total == 0:
+            return []
+        batch = batch or total
+        calls = [("callcontract", (True, amount, contract_id, sender, method) + args)
+                 for contract_id, sender, method, args, amount in
+                 zip(self.ids, self.senders, self.methods, self.args, self.amounts)]
+        throws = self.throws[:]
+        self.clear()
+        results = []
+        for start in range(0, total, batch):
+            chunk = batch_rpc(node, calls[start:start + batch], return_exceptions=True)
+            for result, throw_exception in zip(chunk, throws[start:start + batch]):
+                if throw_exception and isinstance(result, JSONRPCException):
+                    raise result
+            results.extend(chunk)
+            if on_batch:
+                on_batch()
+        return results
+
+
+class ContractCaller(object):
+    '''
+    合约调用函数，由caller_factory生成
+    直接调用时，每次调用都会发送一个callcontract请求；
+    batch_begin()之后的调用会先缓存起来，通过JSON-RPC batch一次性发送
     '''
-    node = mgr.nodes[0]
-    contract_id = contract_id
-    sender = sender
-
-    def _call_contract(func, *args, amount=random.randint(1, 10000), throw_exception=False):
-        if debug:
-            mgr.log.info("%s,%s,%s,%s,%s" % (contract_id, func, sender, amount, args))
-        balance = node.getbalance()
+
+    def __init__(self, mgr, contract_id, sender, debug=False):
+        self.mgr = mgr
+        self.node = mgr.nodes[0]
+        self.contract_id = contract_id
+        self.sender = sender
+        self.debug = debug
+        self._pending = None
+        self._results = None
+        self._flush_every = None
+        self._on_flush = None
+
+    def __call__(self, func, *args, amount=random.randint(1, 10000), throw_exception=False):
+        if self._pending is not None:
+            self._pending.append(self.contract_id, self.sender, func, args, amount, throw_exception)
+            if self._flush_every and len(self._pending) >= self._flush_every:
+                self.flush()
+            return None
+        if self.debug:
+            self.mgr.log.info("%s,%s,%s,%s,%s" % (self.contract_id, func, self.sender, amount, args))
+        balance = self.node.getbalance()
         try:
-            result = node.callcontract(True, amount, contract_id, sender, func, *args)
-            if debug:
-                mgr.log.info("beforecall balance:%s,aftercall balance:%s,in amount:%s,total cost :%s" % (
-            balance, node.getbalance(), amount, balance - node.getbalance() - amount))
+            result = self.node.callcontract(True, amount, self.contract_id, self.sender, func, *args)
+            if self.debug:
+                self.mgr.log.info("beforecall balance:%s,aftercall balance:%s,in amount:%s,total cost :%s" % (
+                    balance, self.node.getbalance(), amount, balance - self.node.getbalance() - amount))
             return result
         except Exception as e:
             if throw_exception:
                 raise
-            print(e)
-            assert all(re.findall('-\d\)$', repr(e)))
-            return repr(e)
+            return self._error_result(e)
+
+    def _error_result(self, e):
+        print(e)
+        assert all(_RPC_ERROR_CODE_RE.findall(repr(e)))
+        return repr(e)
+
+    def batch_begin(self, flush_every=None, on_flush=None):
+        '''
+        开始批量模式，之后的调用返回None，结果由batch_end返回
+        :param flush_every: 缓存满flush_every个调用时自动发送
+        :param on_flush: 每次发送之后执行，例如挖块，避免超出内存池的交易链长度限制
+        :return:
+        '''
+        assert self._pending is None, "batch already begun"
+        self._pending = BulkCaller()
+        self._results = []
+        self._flush_every = flush_every
+        self._on_flush = on_flush
+
+    def flush(self):
+        '''
+        发送缓存的调用
+        :return:
+        '''
+        if not self._pending:
+            return
+        for result in self._pending.flush(self.node):
+            if isinstance(result, JSONRPCException):
+                result = self._error_result(result)
+            self._results.append(result)
+        if self._on_flush:
+            self._on_flush()
+
+    def batch_end(self):
+        '''
+        发送剩余的调用并结束批量模式
+        :return: 批量模式期间所有调用的结果，顺序与调用顺序一致
+        '''
+        try:
+            self.flush()
+            return self._results
+        finally:
+            self._pending = None
+            self._results = None
+
+    @contextmanager
+    def batched(self, flush_every=None, on_flush=None):
+        '''
+        with语句形式的batch_begin/batch_end，as得到的列表在退出时填充所有调用结果
+        '''
+        results = []
+        self.batch_begin(flush_every, on_flush)
+        try:
+            yield results
+        except BaseException:
+            self._pending = None
+            self._results = None
+            raise
+        results.extend(self.batch_end())
+
 
-    return _call_contract
+def caller_factory(mgr, contract_id, sender,debug = False):
+    '''
+
+    :param mgr: the test_framework obj
+    :param contract_id:
+    :param sender:
+    :return: a ContractCaller
+    '''
+    return ContractCaller(mgr, contract_id, sender, debug=debug)
 
 
 def gen_lots_of_contracts(node, contract, num=500):
@@ -59,7 +59,9 @@ BASE_SCRIPTS= [
     'walletbackup.py',#pass
     'feature_moving_checkpoint.py', #pass
     'contract_publish.py',
-    'contract_call.py',
+    'contract_call.py --group=main',
+    'contract_call.py --group=dust',
+    'contract_call.py --group=fatigue',
     'sidechain_sendtobranchchain.py',
     'sidechain_setup.py',
     'sidechain_rpcs.py',
@@ -143,6 +145,7 @@ EXTENDED_SCRIPTS = [
     # 'pruning.py',not test yet
     # vv Tests less than 20m vv
     'smartfees.py',#pass
+    'contract_call.py',  # all groups in one process; split into --group runs in BASE_SCRIPTS
     # vv Tests less than 5m vv
     # 'maxuploadtarget.py', not work
     'mempool_packages.py', #pass
@@ -168,7 +171,9 @@ EXTENDED_SCRIPTS = [
 TRAVIS_SCRIPTS = {
     'contract':[
         "contract_publish.py", 
-        "contract_call.py", 
+        "contract_call.py --group=main",
+        "contract_call.py --group=dust",
+        "contract_call.py --group=fatigue",
         "contract_fork.py",
         'prioritise_contract.py',#pass
         #'abandonconflict-with-contract.py',#failed,unuse case